@@ -16,6 +16,7 @@ import traceback
 import multiprocessing
 import multiprocessing.queues
 import queue
+from collections import defaultdict
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Generic, TypeVar
 
@@ -80,10 +81,93 @@ class Queue(multiprocessing.queues.Queue, Generic[T]):
 
     def get(self, block: bool = True, timeout: float | None = None) -> T:
         """Get an item from the queue."""
+        item = super().get(block, timeout)
         if self._use_custom_counter:
             with self._counter.get_lock():
                 self._counter.value -= 1
-        return super().get(block, timeout)
+        return item
+
+    def close_writer(self) -> None:
+        """Readers and writers share the same pipe, so there is nothing to close."""
+
+    def get_many(self, max_items: int = 64, timeout: float | None = None) -> list[T]:
+        """Get multiple items from the queue.
+        This will wait for the first item, and then grab any others that
+        are immediately available, up to the maximum amount.
+        """
+        items = [self.get(timeout=timeout)]
+        while len(items) < max_items:
+            try:
+                items.append(self.get(block=False))
+            except queue.Empty:
+                break
+        return items
+
+
+class PipeQueue(Generic[T]):
+    """Queue replacement for a channel with a single reader and writer.
+
+    This sends directly through a one way pipe, skipping the feeder
+    thread, lock and semaphore used by `multiprocessing.Queue`.
+    As there is no feeder thread, `put` will block if the pipe buffer
+    is full, so this should only be used where the reader keeps up.
+
+    Each process should close the end it doesn't use, so that if the
+    reader shuts down, `put` will raise `BrokenPipeError` instead of
+    blocking once the buffer fills up.
+    """
+
+    def __init__(self) -> None:
+        self._reader, self._writer = multiprocessing.Pipe(duplex=False)
+        self._counter: Synchronized[int] = multiprocessing.Value('i', 0)
+
+    def qsize(self) -> int:
+        """Get the queue size."""
+        return self._counter.value
+
+    def empty(self) -> bool:
+        """Check if the queue is empty."""
+        return not self._reader.poll()
+
+    def put(self, obj: T, block: bool = True, timeout: float | None = None) -> None:
+        """Add an item to the queue.
+        Sending through a pipe can't time out, so the arguments are
+        only kept for compatibility.
+        """
+        self._writer.send(obj)
+        with self._counter.get_lock():
+            self._counter.value += 1
+
+    def get(self, block: bool = True, timeout: float | None = None) -> T:
+        """Get an item from the queue."""
+        if not block:
+            timeout = 0
+        if timeout is not None and not self._reader.poll(timeout):
+            raise queue.Empty
+        item = self._reader.recv()
+        with self._counter.get_lock():
+            self._counter.value -= 1
+        return item
+
+    def get_nowait(self) -> T:
+        """Get an item from the queue without blocking."""
+        return self.get(block=False)
+
+    def close_reader(self) -> None:
+        """Close the reading end of the pipe for the current process."""
+        self._reader.close()
+
+    def close_writer(self) -> None:
+        """Close the writing end of the pipe for the current process."""
+        self._writer.close()
+
+    def close(self) -> None:
+        """Close the pipe for the current process."""
+        self._reader.close()
+        self._writer.close()
+
+    def cancel_join_thread(self) -> None:
+        """There is no feeder thread, so nothing needs to be done."""
 
 
 class Hub:
@@ -188,11 +272,6 @@ class Hub:
         If these are shut down, then a new process needs to be created.
         """
         print('[Hub] Creating tracking processes...')
-        self._q_tracking: Queue[ipc.Message] = Queue()
-        self._p_tracking = multiprocessing.Process(target=tracking.Tracking.launch, args=(self._q_main, self._q_tracking))
-        self._p_tracking.daemon = True
-        self._p_tracking.start()
-
         self._q_processing: Queue[ipc.Message] = Queue()
         self._p_processing = multiprocessing.Process(target=processing.Processing.launch, args=(self._q_main, self._q_processing))
         self._p_processing.daemon = True
@@ -203,6 +282,14 @@ class Hub:
         self._p_app_detection.daemon = True
         self._p_app_detection.start()
 
+        # The hub is the only writer to the tracking component
+        # This is started last so no other process inherits the pipe
+        self._q_tracking: PipeQueue[ipc.Message] = PipeQueue()
+        self._p_tracking = multiprocessing.Process(target=tracking.Tracking.launch, args=(self._q_main, self._q_tracking))
+        self._p_tracking.daemon = True
+        self._p_tracking.start()
+        self._q_tracking.close_reader()
+
     def _startup_tracking_processes(self) -> None:
         """Ensure the tracking processes exist.
         This will check that previous ones are shut down before starting
@@ -224,69 +311,112 @@ class Hub:
             self.stop_tracking()
 
         # Start processes
+        # Close the previous tracking pipe, as it's replaced with a new one
+        self._q_tracking.close()
         self._create_tracking_processes()
         print('[Hub] Started tracking processes')
 
+    def _get_queue(self, target: int) -> Queue[ipc.Message] | PipeQueue[ipc.Message]:
+        """Get the queue used to send messages to a component."""
+        match target:
+            case ipc.Target.Tracking:
+                return self._q_tracking
+            case ipc.Target.Processing:
+                return self._q_processing
+            case ipc.Target.GUI:
+                return self._q_gui
+            case ipc.Target.AppDetection:
+                return self._q_app_detection
+            case _:
+                raise NotImplementedError(target)
+
     def _process_message(self, message: ipc.Message) -> None:
-        """Execute or forward a message based on its target."""
-        # Process messages meant for the hub
-        if message.target & ipc.Target.Hub:
-            match message:
-                case ipc.StartTracking():
-                    self.state = ipc.TrackingState.Running
-                    self._startup_tracking_processes()
+        """Execute or forward a message based on its target.
 
-                case ipc.PauseTracking():
-                    self.state = ipc.TrackingState.Paused
+        If a batch of messages is received, then the messages will be
+        grouped by target so that each queue only receives one batch.
+        If an exit is requested, the rest of the batch is still handled
+        before `ExitRequest` is raised.
+        """
+        if isinstance(message, ipc.MessageBatch):
+            messages = message.messages
+        else:
+            messages = [message]
 
-                case ipc.StopTracking():
-                    self.state = ipc.TrackingState.Stopped
+        forward: dict[int, list[ipc.Message]] = defaultdict(list)
+        exit_requested = False
+        try:
+            for message in messages:
+                # Process messages meant for the hub
+                if message.target & ipc.Target.Hub:
+                    try:
+                        self._process_hub_message(message)
+                    except ExitRequest:
+                        exit_requested = True
+
+                # Group the messages to forward to other components
+                for target in (ipc.Target.Tracking, ipc.Target.Processing, ipc.Target.GUI, ipc.Target.AppDetection):
+                    if message.target & target:
+                        forward[target].append(message)
+
+        # Forward anything that was processed, even if an error occurred
+        finally:
+            for target, batch in forward.items():
+                try:
+                    if len(batch) == 1:
+                        self._get_queue(target).put(batch[0])
+                    else:
+                        self._get_queue(target).put(ipc.MessageBatch(batch))
 
-                case ipc.Exit():
-                    raise ExitRequest
+                # The tracking process has shut down and closed its pipe
+                except BrokenPipeError:
+                    print(f'[Hub] Unable to send {len(batch)} message(s) to tracking, process has ended')
 
-                case ipc.Traceback():
-                    message.reraise()
+        if exit_requested:
+            raise ExitRequest
 
-                case ipc.DebugRaiseError():
-                    raise RuntimeError('[Hub] Test Exception')
+    def _process_hub_message(self, message: ipc.Message) -> None:
+        """Execute a message meant for the hub."""
+        match message:
+            case ipc.StartTracking():
+                self.state = ipc.TrackingState.Running
+                self._startup_tracking_processes()
 
-                case ipc.RequestQueueSize():
-                    self._q_main.put(ipc.QueueSize(self._q_main.qsize(),
-                                                   self._q_tracking.qsize(),
-                                                   self._q_processing.qsize(),
-                                                   self._q_gui.qsize(),
-                                                   self._q_app_detection.qsize()))
+            case ipc.PauseTracking():
+                self.state = ipc.TrackingState.Paused
 
-                case ipc.ToggleConsole():
-                    self._toggle_console(message.show)
+            case ipc.StopTracking():
+                self.state = ipc.TrackingState.Stopped
 
-                case ipc.RequestPID():
-                    self._q_main.put(ipc.SendPID(source=ipc.Target.Hub, pid=os.getpid()))
+            case ipc.Exit():
+                raise ExitRequest
 
-                case ipc.ComponentLoaded():
-                    self._wait_to_load.discard(message.component)
-                    if not self._wait_to_load:
-                        self._q_main.put(ipc.AllComponentsLoaded())
+            case ipc.Traceback():
+                message.reraise()
 
-                case ipc.AllComponentsLoaded():
-                    self.start_tracking()
+            case ipc.DebugRaiseError():
+                raise RuntimeError('[Hub] Test Exception')
 
-        # Forward messages to the tracking process
-        if message.target & ipc.Target.Tracking:
-            self._q_tracking.put(message)
+            case ipc.RequestQueueSize():
+                self._q_main.put(ipc.QueueSize(self._q_main.qsize(),
+                                               self._q_tracking.qsize(),
+                                               self._q_processing.qsize(),
+                                               self._q_gui.qsize(),
+                                               self._q_app_detection.qsize()))
 
-        # Forward messages to the processing process
-        if message.target & ipc.Target.Processing:
-            self._q_processing.put(message)
+            case ipc.ToggleConsole():
+                self._toggle_console(message.show)
 
-        # Forward messages to the GUI process
-        if message.target & ipc.Target.GUI:
-            self._q_gui.put(message)
+            case ipc.RequestPID():
+                self._q_main.put(ipc.SendPID(source=ipc.Target.Hub, pid=os.getpid()))
 
-        # Forward messages to the app detection process
-        if message.target & ipc.Target.AppDetection:
-            self._q_app_detection.put(message)
+            case ipc.ComponentLoaded():
+                self._wait_to_load.discard(message.component)
+                if not self._wait_to_load:
+                    self._q_main.put(ipc.AllComponentsLoaded())
+
+            case ipc.AllComponentsLoaded():
+                self.start_tracking()
 
     def _get_console_handle(self) -> WindowHandle | None:
         """Get the handle to the console."""
@@ -338,16 +468,17 @@ class Hub:
             print('[Hub] Queue handler started.')
             while running or not self._q_main.empty():
                 self._test_components()
-                try:
-                    self._process_message(self._q_main.get())
+                for message in self._q_main.get_many():
+                    try:
+                        self._process_message(message)
 
-                except ExitRequest:
-                    print('[Hub] Exit requested, triggering shut down...')
-                    running = False
+                    except ExitRequest:
+                        print('[Hub] Exit requested, triggering shut down...')
+                        running = False
 
-                    # Avoid shutting down before tracking can respond
-                    # Without this, the save on exit feature won't work
-                    time.sleep(1 / UPDATES_PER_SECOND)
+                        # Avoid shutting down before tracking can respond
+                        # Without this, the save on exit feature won't work
+                        time.sleep(1 / UPDATES_PER_SECOND)
 
         except Exception:
             traceback.print_exc()
@@ -1,5 +1,7 @@
-import multiprocessing
+from __future__ import annotations
+
 import os
+import queue
 import time
 import traceback
 from typing import TYPE_CHECKING, Iterator
@@ -10,13 +12,16 @@ from . import ipc
 from ..exceptions import ExitRequest
 
 if TYPE_CHECKING:
-    import multiprocessing.queues
+    from . import PipeQueue, Queue
 
 
 class Component:
-    def __init__(self, q_send: multiprocessing.queues.Queue, q_receive: multiprocessing.queues.Queue) -> None:
+    def __init__(self, q_send: Queue[ipc.Message], q_receive: Queue[ipc.Message] | PipeQueue[ipc.Message]) -> None:
         self._q_send = q_send
         self._q_recv = q_receive
+
+        # Close the sending end so the hub can detect a shutdown
+        self._q_recv.close_writer()
         self.name = type(self).__name__
         self.__post_init__()
         self._parent_pid = os.getppid()
@@ -71,9 +76,9 @@ class Component:
 
         This does not use timeouts, as the Hub process shutting down
         would cause locks if a read was mid-timeout. Instead, a check
-        is first done to ensure the Hub is still running, then a check
-        is done if the queue is empty or not. The Hub check is done per
-        queue item so that a backlog of commands won't cause issues.
+        is first done to ensure the Hub is still running, then a non
+        blocking read is attempted. The Hub check is done per queue
+        item so that a backlog of commands won't cause issues.
         """
         while True:
             # Trigger an emergecy shutdown if the hub is not running
@@ -86,22 +91,27 @@ class Component:
                 yield ipc.Exit()
                 return
 
-            # Check if the queue is empty
-            if self._q_recv.empty():
+            # Read from the queue, or wait if it is empty
+            try:
+                message = self._q_recv.get_nowait()
+            except queue.Empty:
                 if not polling_rate:
                     return
                 time.sleep(polling_rate)
                 continue
 
-            # Read from the queue
-            message = self._q_recv.get()
+            if isinstance(message, ipc.MessageBatch):
+                messages = message.messages
+            else:
+                messages = [message]
 
-            # Intercept message if required, otherwise yield
-            match message:
-                case ipc.RequestPID():
-                    self.send_data(ipc.SendPID(source=self.target, pid=os.getpid()))
-                case _:
-                    yield message
+            for message in messages:
+                # Intercept message if required, otherwise yield
+                match message:
+                    case ipc.RequestPID():
+                        self.send_data(ipc.SendPID(source=self.target, pid=os.getpid()))
+                    case _:
+                        yield message
 
     def run(self) -> None:
         """Run the component."""
@@ -112,7 +122,7 @@ class Component:
         """
 
     @classmethod
-    def launch(cls, q_send: multiprocessing.queues.Queue, q_receive: multiprocessing.queues.Queue) -> None:
+    def launch(cls, q_send: Queue[ipc.Message], q_receive: Queue[ipc.Message] | PipeQueue[ipc.Message]) -> None:
         # Attempt to initialise the class
         try:
             self = cls(q_send, q_receive)
@@ -28,6 +28,12 @@ class QueueWorker(QtCore.QObject):
         """Continuously poll the queue for messages."""
         while True:
             for message in self.component.receive_data():
+                # Copy renders out of shared memory so the block can be reused
+                if isinstance(message, ipc.Render):
+                    message.load()
+                    if message.frame.name:
+                        self.component.send_data(ipc.RenderReleased(message.frame.name))
+
                 self.message_received.emit(message)
                 match message:
                     case ipc.Exit():
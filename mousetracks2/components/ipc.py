@@ -1,8 +1,11 @@
 """Standard format for data to be sent through communication queues."""
 
-from dataclasses import dataclass, field
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass, field, fields
 from enum import Enum, IntFlag, auto
-from typing import Literal
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Literal, Self
 
 import numpy as np
 import numpy.typing as npt
@@ -52,6 +55,107 @@ class TrackingState(Enum):
     Stopped = auto()
 
 
+@dataclass
+class SharedArray:
+    """Reference to an array stored in shared memory.
+
+    Only this metadata gets pickled when sent through a queue, so the
+    cost of sending it doesn't depend on the size of the array.
+    """
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+    def read(self) -> np.ndarray:
+        """Copy the array out of shared memory.
+
+        Raises:
+            FileNotFoundError: If the block has already been removed.
+        """
+        if not self.name:
+            return np.zeros(self.shape, dtype=self.dtype)
+
+        shm = SharedMemory(self.name)
+        try:
+            view: np.ndarray = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+            array = view.copy()
+            del view
+        finally:
+            shm.close()
+        return array
+
+
+class SharedFramePool:
+    """Reuse shared memory blocks for sending arrays between processes.
+
+    A block is in use from when an array is stored, until the consumer
+    calls `release` with its name. Only released blocks are reused, so
+    a frame is never overwritten before it has been read. Released
+    blocks are grouped by size, and only the most recently used sizes
+    are kept allocated.
+    """
+
+    def __init__(self, max_sizes: int = 4) -> None:
+        self.max_sizes = max_sizes
+        self._free: OrderedDict[int, list[SharedMemory]] = OrderedDict()
+        self._in_use: dict[str, tuple[int, SharedMemory]] = {}
+
+    def store(self, array: np.ndarray) -> SharedArray:
+        """Copy an array into shared memory."""
+        array = np.ascontiguousarray(array)
+        if not array.nbytes:
+            return SharedArray('', array.shape, array.dtype.str)
+
+        # Get a free block of the same size
+        size = array.nbytes
+        blocks = self._free.setdefault(size, [])
+        self._free.move_to_end(size)
+        shm = blocks.pop() if blocks else SharedMemory(create=True, size=size)
+        self._in_use[shm.name] = (size, shm)
+
+        view: np.ndarray = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        np.copyto(view, array)
+        del view
+
+        # Free up any sizes that haven't been used recently
+        while len(self._free) > self.max_sizes:
+            _, unused_blocks = self._free.popitem(last=False)
+            for block in unused_blocks:
+                self._release(block)
+
+        return SharedArray(shm.name, array.shape, array.dtype.str)
+
+    def release(self, name: str) -> None:
+        """Mark a block as read so it can be reused."""
+        # The block size may be rounded up, so use the requested size
+        try:
+            size, shm = self._in_use.pop(name)
+        except KeyError:
+            return
+        if size in self._free:
+            self._free[size].append(shm)
+        else:
+            self._release(shm)
+
+    def close(self) -> None:
+        """Release all shared memory blocks."""
+        for blocks in self._free.values():
+            for block in blocks:
+                self._release(block)
+        for _, block in self._in_use.values():
+            self._release(block)
+        self._free.clear()
+        self._in_use.clear()
+
+    @staticmethod
+    def _release(block: SharedMemory) -> None:
+        """Close and remove a shared memory block."""
+        block.close()
+        with suppress(FileNotFoundError):
+            block.unlink()
+
+
 @dataclass
 class Message:
     """Represents an item to be passed through a communication queue.
@@ -64,6 +168,39 @@ class Message:
 
     target: int = field(default=0)
 
+    def __reduce__(self) -> tuple[type[Self], tuple[Any, ...]]:
+        """Pickle the message as its class and init values.
+
+        This is smaller and faster than the default, which stores every
+        attribute name alongside its value. Any fields not set through
+        `__init__` are skipped, such as cached data.
+        """
+        return type(self), tuple(getattr(self, name) for name in _init_field_names(type(self)))
+
+
+_INIT_FIELD_NAMES: dict[type[Message], tuple[str, ...]] = {}
+
+
+def _init_field_names(cls: type[Message]) -> tuple[str, ...]:
+    """Get the names of the fields a message is initialised with."""
+    try:
+        return _INIT_FIELD_NAMES[cls]
+    except KeyError:
+        names = _INIT_FIELD_NAMES[cls] = tuple(f.name for f in fields(cls) if f.init)
+        return names
+
+
+@dataclass
+class MessageBatch(Message):
+    """Group multiple messages to be sent through a queue at once.
+
+    The hub will split these back up and forward each message to its
+    own targets, and `Component.receive_data` will unpack them.
+    """
+
+    target: int = field(default=Target.Hub, init=False)
+    messages: list[Message] = field(default_factory=list)
+
 
 @dataclass
 class Tick(Message):
@@ -239,12 +376,43 @@ class RenderRequest(Message):
 
 @dataclass
 class Render(Message):
-    """A render has been completed."""
+    """A render has been completed.
+
+    The array is passed through shared memory rather than the queue.
+    """
 
     target: int = field(default=Target.GUI, init=False)
-    array: npt.NDArray[np.uint8]
+    frame: SharedArray
     request: RenderRequest
+    expired: bool = field(default=False, init=False, compare=False)
+    _array: npt.NDArray[np.uint8] | None = field(default=None, init=False, repr=False, compare=False)
 
+    def load(self) -> npt.NDArray[np.uint8]:
+        """Copy the rendered array out of shared memory.
+
+        If the shared memory was removed before it could be read, such
+        as when processing has shut down, then `expired` will be set.
+        """
+        if self._array is None:
+            try:
+                self._array = self.frame.read()
+            except FileNotFoundError:
+                self.expired = True
+                self._array = np.zeros([0] * len(self.frame.shape), dtype=np.uint8)
+        return self._array
+
+    @property
+    def array(self) -> npt.NDArray[np.uint8]:
+        """Get the rendered array."""
+        return self.load()
+
+
+@dataclass
+class RenderReleased(Message):
+    """The GUI has finished reading a render from shared memory."""
+
+    target: int = field(default=Target.Processing, init=False)
+    name: str
 
 
 @dataclass
@@ -20,7 +20,7 @@ from ..file import ArrayResolutionMap, MovementMaps, TrackingProfile, TrackingPr
 from ..legacy import keyboard
 from ..types import RectList
 from ..utils import keycodes
-from ..utils.math import calculate_line, calculate_distance
+from ..utils.math import calculate_line_array, calculate_distance
 from ..utils.monitor import MonitorData
 from ..utils.input import get_cursor_pos
 from ..utils.interface import Interfaces
@@ -63,12 +63,16 @@ class Processing(Component):
         self.previous_mouse_click: PreviousMouseClick | None = None
         self.monitor_data = MonitorData()
         self.previous_monitor = None
+        self._monitor_rects: RectList | None = None
 
         # Load in the default profile
         self.all_profiles = TrackingProfileLoader()
         self._current_application = Application('', RectList())
         self.current_application = Application(DEFAULT_PROFILE_NAME, RectList())
 
+        # Renders are sent to the GUI through shared memory
+        self._frame_pool = ipc.SharedFramePool()
+
     @property
     def timestamp(self) -> int:
         """Get the timestamp."""
@@ -97,6 +101,7 @@ class Processing(Component):
         if application == self._current_application:
             return
         self._current_application = application
+        self._monitor_rects = None
 
         # Reset the data
         self.profile.cursor_map.position = None
@@ -166,14 +171,52 @@ class Processing(Component):
         current_day = self.timestamp // 86400
         return max(0, current_day - creation_day)
 
+    @property
+    def monitor_rects(self) -> RectList:
+        """Get the rects that pixels are recorded to.
+
+        This is cached as it's required for every movement, and must be
+        reset whenever the monitors, application, multi monitor setting
+        or loaded profiles change. If the monitors are being combined,
+        then the combined rect is precalculated.
+        """
+        if self._monitor_rects is None:
+            monitors = self.monitor_data.physical
+            if self.current_application.rects:
+                monitors = self.current_application.rects
+
+            single_monitor = bool(CLI.single_monitor) if self.profile.config.multi_monitor is None else not self.profile.config.multi_monitor
+            if single_monitor and monitors:
+                monitors = RectList([monitors.combined_rect()])
+            self._monitor_rects = monitors
+        return self._monitor_rects
+
     def _monitor_offset(self, pixel: tuple[int, int]) -> tuple[tuple[int, int], tuple[int, int]] | None:
         """Detect which monitor the pixel is on."""
-        monitors = self.monitor_data.physical
-        if self.current_application.rects:
-            monitors = self.current_application.rects
+        return self.monitor_rects.calculate_offset(pixel)
 
-        single_monitor = bool(CLI.single_monitor) if self.profile.config.multi_monitor is None else not self.profile.config.multi_monitor
-        return monitors.calculate_offset(pixel, combined=single_monitor)
+    def _monitor_offsets(self, pixels: npt.NDArray[np.integer]) -> Iterator[tuple[tuple[int, int], npt.NDArray[np.integer]]]:
+        """Detect which monitor each pixel in an array is on."""
+        return self.monitor_rects.calculate_offsets(pixels)
+
+    def _record_pixels(self, data: MovementMaps, pixels: npt.NDArray[np.integer], speed: int,
+                       force_monitor: tuple[int, int] | None = None) -> None:
+        """Record the pixels of a movement, grouped by monitor."""
+        if force_monitor is None:
+            monitor_pixels = self._monitor_offsets(pixels)
+        else:
+            monitor_pixels = iter([(force_monitor, pixels)])
+
+        for current_monitor, offsets in monitor_pixels:
+            index = (offsets[:, 1], offsets[:, 0])
+            data.sequential_arrays[current_monitor][index] = data.counter
+
+            # Use uint64 so the values can't overflow before the dtype is updated
+            density_array = data.density_arrays[current_monitor]
+            density_array[index] = np.add(density_array[index], 1, dtype=np.uint64)
+            if speed:
+                speed_array = data.speed_arrays[current_monitor]
+                speed_array[index] = np.maximum(speed_array[index], speed, dtype=np.uint64)
 
     def _record_move(self, data: MovementMaps, position: tuple[int, int],
                      force_monitor: tuple[int, int] | None = None) -> float:
@@ -210,21 +253,12 @@ class Processing(Component):
         data.distance += distance
         moving = self.tick == data.tick + 1
 
-        # Add the pixels to an array
-        for pixel in calculate_line(old_position, new_position):
-            if force_monitor is None:
-                result = self._monitor_offset(pixel)
-                if result is None:
-                    continue
-                current_monitor, pixel = result
-            else:
-                current_monitor = force_monitor
-
-            index = (pixel[1], pixel[0])
-            data.sequential_arrays[current_monitor][index] = data.counter
-            data.density_arrays[current_monitor][index] += 1
-            if distance and moving:
-                data.speed_arrays[current_monitor][index] = max(data.speed_arrays[current_monitor][index], round(100 * distance))
+        # Add the pixels to the arrays
+        # If the cursor hasn't moved then there's nothing to add
+        pixels = calculate_line_array(old_position, new_position)
+        if len(pixels):
+            speed = round(100 * distance) if distance and moving else 0
+            self._record_pixels(data, pixels, speed, force_monitor)
 
         # Update the saved data
         data.position = position
@@ -335,11 +369,6 @@ class Processing(Component):
         positional_arrays = self._arrays_for_rendering(profile, render_type, left_clicks=left_clicks,
                                                        middle_clicks=middle_clicks, right_clicks=right_clicks)
 
-        # Add extra padding
-        if padding is not None:
-            for position, arrays in positional_arrays.items():
-                positional_arrays[position] = [np.pad(array, padding) for array in arrays]
-
         # Adjust width/height if not locking the aspect ratio
         if positional_arrays and not lock_aspect and width is not None and height is not None:
             width_items = max(x for x, y in positional_arrays) - min(x for x, y in positional_arrays) + 1
@@ -352,7 +381,7 @@ class Processing(Component):
             image = render(colour_map, positional_arrays, width, height, sampling,
                            lock_aspect=lock_aspect, linear=linear, invert=invert,
                            blur=blur, contrast=contrast, clipping=clipping,
-                           interpolation_order=interpolation_order)
+                           interpolation_order=interpolation_order, padding=padding)
         except EmptyRenderError:
             image = np.ndarray([0, 0, 4], dtype=np.uint8)
 
@@ -513,7 +542,7 @@ class Processing(Component):
                                                middle_clicks=message.show_middle_clicks,
                                                right_clicks=message.show_right_clicks,
                                                interpolation_order=message.interpolation_order)
-                self.send_data(ipc.Render(image, message))
+                self.send_data(ipc.Render(self._frame_pool.store(image), message))
 
                 print('[Processing] Render request completed')
 
@@ -610,9 +639,12 @@ class Processing(Component):
                 if message.layers[0].request.file_path is None:
                     layer_blend.add_checkerbox()
 
-                self.send_data(ipc.Render(layer_blend.to_uint8(), request))
+                self.send_data(ipc.Render(self._frame_pool.store(layer_blend.to_uint8()), request))
                 print('[Processing] Render request completed')
 
+            case ipc.RenderReleased():
+                self._frame_pool.release(message.name)
+
             case ipc.MouseMove():
                 if not self.profile.config.track_mouse:
                     return
@@ -699,6 +731,7 @@ class Processing(Component):
             case ipc.MonitorsChanged():
                 print(f'[Processing] Monitors changed.')
                 self.monitor_data = message.data
+                self._monitor_rects = None
 
             case ipc.ThumbstickMove():
                 if not self.profile.config.track_gamepad:
@@ -846,17 +879,20 @@ class Processing(Component):
                 del self.all_profiles[message.profile_name]
                 with suppress(FileNotFoundError):
                     send2trash(get_filename(message.profile_name))
+                self._monitor_rects = None
 
             case ipc.ImportProfile():
                 profile = self.all_profiles[message.name] = TrackingProfile.load(message.path)
                 profile.name = message.name
                 profile.is_modified = True
+                self._monitor_rects = None
 
             case ipc.ImportLegacyProfile():
                 profile = TrackingProfile(message.name)
                 if profile.import_legacy(message.path):
                     profile.is_modified = True
                     self.all_profiles[message.name] = profile
+                    self._monitor_rects = None
                 else:
                     self.send_data(ipc.FailedProfileImport(message))
 
@@ -876,6 +912,7 @@ class Processing(Component):
                 profile = self.all_profiles[message.profile]
                 profile.is_modified = True
                 profile.config.multi_monitor = message.multi_monitor
+                self._monitor_rects = None
 
             case _:
                 raise NotImplementedError(message)
@@ -884,3 +921,7 @@ class Processing(Component):
         """Listen for events to process."""
         for message in self.receive_data(polling_rate=1 / UPDATES_PER_SECOND):
             self._process_message(message)
+
+    def on_exit(self) -> None:
+        """Release the shared memory."""
+        self._frame_pool.close()
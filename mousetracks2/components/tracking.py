@@ -1,3 +1,4 @@
+import threading
 import time
 import traceback
 from collections import defaultdict
@@ -40,14 +41,17 @@ def ticks(ups: int) -> Iterator[int]:
     count at a constant rate, resuming from the previous tick.
     For example, if a PC gets put to sleep, then waking it up should
     resume from the tick it was put to sleep at.
+
+    A monotonic clock is used so that changes to the system time can't
+    cause the ticks to stall or skip ahead.
     """
-    start = time.time()
+    start = time.monotonic()
     for tick in count():
         yield tick
 
         # Calculate the expected time for the next tick
         expected = start + (tick + 1) / ups
-        remaining = expected - time.time()
+        remaining = expected - time.monotonic()
 
         # Adjust the start time to account for missed time
         if remaining < 0:
@@ -133,6 +137,39 @@ class Tracking(Component):
         self._monitor_listener = MonitorEventsListener()
         self._monitor_listener.start()
 
+        self._batch: list[ipc.Message] | None = None
+        self._batch_lock = threading.Lock()
+
+    def send_data(self, message: ipc.Message) -> None:
+        """Send a message, or add it to the batch if one is active.
+
+        The lock is held while sending, so that a message from another
+        thread cannot be sent ahead of a batch that is being flushed.
+        """
+        with self._batch_lock:
+            if self._batch is not None:
+                self._batch.append(message)
+            else:
+                super().send_data(message)
+
+    @contextmanager
+    def _batch_messages(self) -> Iterator[None]:
+        """Group all messages sent within the context into a single put.
+
+        This includes messages sent from the `pynput` threads.
+        """
+        with self._batch_lock:
+            self._batch = []
+        try:
+            yield
+        finally:
+            with self._batch_lock:
+                messages, self._batch = self._batch, None
+                if len(messages) == 1:
+                    super().send_data(messages[0])
+                elif messages:
+                    super().send_data(ipc.MessageBatch(messages))
+
     def _receive_data(self) -> None:
         for message in self.receive_data():
             match message:
@@ -231,7 +268,9 @@ class Tracking(Component):
                     if self.data.tick_modified == tick - 1:
                         self.data.tick_modified += 1
 
-                    yield tick, self.data
+                    # Anything sent during the tick will be batched
+                    with self._batch_messages():
+                        yield tick, self.data
 
                 # When tracking is paused then stop here
                 case ipc.TrackingState.Paused:
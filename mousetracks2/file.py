@@ -5,8 +5,9 @@ import time
 import zipfile
 from collections import defaultdict
 from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Generic, Iterator, Self, Sequence, Type, TypeVar
+from typing import Any, Generic, Iterator, Self, Sequence, Type, TypeVar, overload
 from uuid import uuid4
 
 import numpy as np
@@ -25,6 +26,12 @@ EXTENSION = 'mtk'
 
 PROFILE_DIR = CLI.data_dir / 'Profiles'
 
+ZIP_COMPRESSION_LEVEL = 4
+"""DEFLATE level used when saving profiles.
+The tracking arrays are mostly empty with long runs of similar values,
+which level 4 compresses faster than the default.
+"""
+
 _DType_co = TypeVar('_DType_co', bound=np.generic, covariant=True)
 
 _ScalarType_co = TypeVar('_ScalarType_co', covariant=True)
@@ -37,7 +44,7 @@ class TrackingArray(Generic[_DType_co, _ScalarType_co]):
     an array in-place isn't supported.
     """
 
-    array: npt.NDArray[_DType_co]
+    _array: npt.NDArray[_DType_co]
     auto_pad: list[bool]
 
     def __init__(self, shape: int | Sequence[int] | npt.NDArray[Any],
@@ -68,6 +75,16 @@ class TrackingArray(Generic[_DType_co, _ScalarType_co]):
         """Return a copy of the same array with all values as 0."""
         return type(self)(self.shape, self.dtype, self.auto_pad)
 
+    @property
+    def array(self) -> npt.NDArray[_DType_co]:
+        """Get the underlying array."""
+        return self._array
+
+    @array.setter
+    def array(self, array: npt.NDArray[_DType_co]) -> None:
+        """Replace the underlying array."""
+        self._array = array
+
     def __array__(self) -> npt.NDArray[_DType_co]:
         """For internal numpy usage."""
         return self.array
@@ -138,8 +155,14 @@ class TrackingArray(Generic[_DType_co, _ScalarType_co]):
             self.array[item] = value
 
     def _write_to_zip(self, zf: zipfile.ZipFile, path: str) -> None:
+        """Write the array in the `.npy` format.
+        The data is passed to the zip file as a single buffer, as
+        `np.save` would copy it in chunks for non file objects.
+        """
+        array = np.ascontiguousarray(self.array)
         with zf.open(path, 'w') as f:
-            np.save(f, self, allow_pickle=False)
+            np.lib.format.write_array_header_1_0(f, np.lib.format.header_data_from_array_1_0(array))
+            f.write(array.data)
 
     def _load_from_zip(self, zf: zipfile.ZipFile, path: str) -> None:
         with zf.open(path, 'r') as f:
@@ -155,54 +178,146 @@ class TrackingIntArray(TrackingArray[np.unsignedinteger, int]):
 
     MAX_VALUES: list[int] = [np.iinfo(dtype).max for dtype in DTYPES]
 
+    # Index of the smallest dtype that can store a value below its max,
+    # using the bit length of the value + 1
+    _DTYPE_INDEX_BY_BITS: list[int] = [0] * 9 + [1] * 8 + [2] * 16 + [3] * 33
+
     def __init__(self, shape: int | Sequence[int] | npt.NDArray[Any],
-                 auto_pad: bool | list[bool] = False) -> None:
+                 auto_pad: bool | list[bool] = False,
+                 min_dtype: type[np.unsignedinteger] = np.uint8) -> None:
         """Set up the tracking array..
 
         Parameters:
             shape: Set the shape of the new array.
                 An existing array may be passed in here.
             auto_pad: If the array can increase in size.
+            min_dtype: The smallest dtype to use.
+                Set this if the values are known to get large, to avoid
+                copying the array each time the dtype is upgraded.
         """
+        self.min_dtype = min_dtype
+
         # Choose the best dtype to use
         max_int = 0
         if isinstance(shape, np.ndarray):
             max_int = np.max(shape)
-        for dtype, max_value in zip(self.DTYPES, self.MAX_VALUES):
+        start = self.DTYPES.index(min_dtype)
+        for dtype, max_value in zip(self.DTYPES[start:], self.MAX_VALUES[start:]):
             if max_int < max_value:
                 break
         else:
             raise ValueError('int too high')
         self.max_value = np.iinfo(dtype).max
+        self._nonzero_count: int | None = None
 
         super().__init__(shape, dtype, auto_pad=auto_pad)
 
     def as_zero(self) -> Self:
         """Return a copy of the same array with all values as 0."""
-        return type(self)(self.shape, self.auto_pad)
+        return type(self)(self.shape, self.auto_pad, self.min_dtype)
 
-    def __getitem__(self, item: Any) -> int:
-        """Get an array item."""
-        return int(super().__getitem__(item))
+    @property
+    def array(self) -> npt.NDArray[np.unsignedinteger]:
+        """Get the underlying array."""
+        return self._array
 
-    def __setitem__(self, item: int | tuple[int, ...], value: int) -> None:
-        """Set an array item, changing dtype if required."""
+    @array.setter
+    def array(self, array: npt.NDArray[np.unsignedinteger]) -> None:
+        """Replace the underlying array."""
+        self._array = array
+        self._nonzero_count = None
+
+    @property
+    def nonzero_count(self) -> int:
+        """Get the number of non zero values.
+        This is cached and kept up to date when setting items, as it
+        is needed for every render and otherwise requires a full scan.
+        """
+        if self._nonzero_count is None:
+            self._nonzero_count = int(np.count_nonzero(self.array))
+        return self._nonzero_count
+
+    @overload
+    def __getitem__(self, item: int | tuple[int, ...]) -> int: ...
+    @overload
+    def __getitem__(self, item: slice | npt.NDArray[Any] | tuple[Any, ...]) -> npt.NDArray[np.unsignedinteger]: ...
+    def __getitem__(self, item: Any) -> int | npt.NDArray[np.unsignedinteger]:
+        """Get an array item, or multiple items if indexing by array."""
+        result = super().__getitem__(item)
+        if isinstance(result, np.ndarray):
+            return result
+        return int(result)
+
+    def __setitem__(self, item: Any, value: int | npt.NDArray[np.unsignedinteger]) -> None:
+        """Set an array item, changing dtype if required.
+        If indexing by array, the indexes are expected to be unique.
+        """
         self._check_dtype(value)
+        if self._nonzero_count is None:
+            super().__setitem__(item, value)
+            return
+
+        # Update the non zero count from the values being replaced
+        # Reading the previous values may pad the array, so store the count
+        nonzero_count = self._nonzero_count
+        nonzero_count -= int(np.count_nonzero(super().__getitem__(item)))
         super().__setitem__(item, value)
+        self._nonzero_count = nonzero_count + int(np.count_nonzero(super().__getitem__(item)))
+
+    def bulk_set(self, indices: npt.ArrayLike, values: npt.ArrayLike) -> None:
+        """Set multiple items at once.
+        The padding and dtype are only checked once for all values.
+
+        Parameters:
+            indices: Array of unique indexes with a shape of (n, ndim).
+                For 1D arrays, a shape of (n,) may be used.
+            values: Array of values with a shape of (n,).
+        """
+        index_array = np.asarray(indices, dtype=np.intp)
+        if not index_array.size:
+            return
+        if index_array.ndim == 1:
+            index_array = index_array[:, np.newaxis]
+
+        self._check_padding(index_array.max(axis=0).tolist())
+        self[tuple(index_array.T)] = np.asarray(values, dtype=np.uint64)
+
+    def __itruediv__(self, value: float) -> Self:
+        """Divide all values in place.
+        The results are rounded down to keep the current dtype.
+        """
+        # Integer division avoids converting each value to a float
+        if float(value).is_integer():
+            np.floor_divide(self.array, int(value), out=self.array)
+        else:
+            np.divide(self.array, value, out=self.array, casting='unsafe')
+        self._nonzero_count = None
+        return self
 
     def _load_from_zip(self, zf: zipfile.ZipFile, path: str) -> None:
         """Load data and update the internal max value."""
         super()._load_from_zip(zf, path)
-        self.max_value = np.iinfo(self.dtype).max
 
-    def _check_dtype(self, value: int) -> None:
-        """Check that the dtype is valid for the given value."""
+        # Leave any upcasting to the minimum dtype until the first write
+        # Setting the max value to 0 ensures the next check will do it
+        if self.dtype.itemsize < np.dtype(self.min_dtype).itemsize:
+            self.max_value = 0
+        else:
+            self.max_value = np.iinfo(self.dtype).max
+
+    def _check_dtype(self, value: int | npt.NDArray[np.unsignedinteger]) -> None:
+        """Check that the dtype is valid for the given value.
+        If an array is given, then its highest value is checked.
+        """
+        if isinstance(value, np.ndarray):
+            if not value.size:
+                return
+            value = value.max()
         if value >= self.max_value:
-            for dtype, max_value in zip(self.DTYPES, self.MAX_VALUES):
-                if value < max_value:
-                    self.max_value = max_value
-                    self.array = self.array.astype(dtype)
-                    break
+            bits = min((int(value) + 1).bit_length(), len(self._DTYPE_INDEX_BY_BITS) - 1)
+            index = max(self._DTYPE_INDEX_BY_BITS[bits], self.DTYPES.index(self.min_dtype))
+            self.max_value = self.MAX_VALUES[index]
+            self.array = self.array.astype(self.DTYPES[index], copy=False)
 
 
 class ArrayResolutionMap(dict[tuple[int, int], TrackingIntArray]):
@@ -210,8 +325,12 @@ class ArrayResolutionMap(dict[tuple[int, int], TrackingIntArray]):
     New arrays will be created on demand.
     """
 
+    def __init__(self, min_dtype: type[np.unsignedinteger] = np.uint8) -> None:
+        super().__init__()
+        self.min_dtype = min_dtype
+
     def __missing__(self, key: tuple[int, int]) -> TrackingIntArray:
-        self[key] = TrackingIntArray((key[1], key[0]))
+        self[key] = TrackingIntArray((key[1], key[0]), min_dtype=self.min_dtype)
         return self[key]
 
     def __setitem__(self, key: tuple[int, int], array: npt.NDArray[np.unsignedinteger] | TrackingIntArray) -> None:
@@ -220,6 +339,16 @@ class ArrayResolutionMap(dict[tuple[int, int], TrackingIntArray]):
         else:
             super().__setitem__(key, array)
 
+    def __itruediv__(self, value: float) -> Self:
+        """Divide all arrays in place.
+        Any arrays left without data will be removed.
+        """
+        for res, array in tuple(self.items()):
+            array /= value
+            if not array.array.any():
+                del self[res]
+        return self
+
     def _write_to_zip(self, zf: zipfile.ZipFile, subfolder: str) -> None:
         for (width, height), array in self.items():
             array._write_to_zip(zf, f'{subfolder}/{width}x{height}.npy')
@@ -227,12 +356,25 @@ class ArrayResolutionMap(dict[tuple[int, int], TrackingIntArray]):
     def _load_from_zip(self, zf: zipfile.ZipFile, subfolder: str) -> None:
         relative_paths = [path[len(subfolder):].lstrip('/') for path in zf.namelist() if path.startswith(subfolder)]
 
+        arrays: dict[str, TrackingIntArray] = {}
         for relative_path in relative_paths:
-            match = re.match(r'(\d+)x(\d+)\.npy', relative_path)
-            if match is None:
+            name, _, ext = relative_path.rpartition('.')
+            width_str, _, height_str = name.partition('x')
+            if ext != 'npy' or not width_str.isdecimal() or not height_str.isdecimal():
                 raise RuntimeError(f'unexpected data in filename: {subfolder}/{relative_path}')
-            width, height = map(int, match.groups())
-            self[(width, height)]._load_from_zip(zf, f'{subfolder}/{relative_path}')
+            width, height = int(width_str), int(height_str)
+            arrays[f'{subfolder}/{relative_path}'] = self[(width, height)]
+
+        if len(arrays) <= 1:
+            for path, array in arrays.items():
+                array._load_from_zip(zf, path)
+            return
+
+        # Decompression releases the GIL, so read each resolution in parallel
+        with ThreadPoolExecutor() as executor:
+            futures = [executor.submit(array._load_from_zip, zf, path) for path, array in arrays.items()]
+            for future in futures:
+                future.result()
 
 
 @dataclass
@@ -242,7 +384,8 @@ class MovementMaps:
     _MAX_VALUE = 2 ** 64 - 1
 
     position: tuple[int, int] | None = field(default=None)  # TODO: Don't store here
-    sequential_arrays: ArrayResolutionMap = field(default_factory=ArrayResolutionMap)
+    # The counter quickly gets large, but stays below the compression threshold
+    sequential_arrays: ArrayResolutionMap = field(default_factory=lambda: ArrayResolutionMap(np.uint32))
     density_arrays: ArrayResolutionMap = field(default_factory=ArrayResolutionMap)
     speed_arrays: ArrayResolutionMap = field(default_factory=ArrayResolutionMap)
     distance: float = field(default=0.0)
@@ -260,18 +403,11 @@ class MovementMaps:
         This is important for the time arrays, but helps flatten out
         speed values that are too large.
         """
-        for maps in (self.sequential_arrays, self.speed_arrays):
-            # Compress all arrays
-            for res, tracking_array in tuple(maps.items()):
-                array = np.asarray(tracking_array)
-                maps[res] = (array.astype(np.float64) / factor).astype(array.dtype)
-
-                # Remove array if it no longer contains data
-                if not np.any(maps[res]):
-                    del maps[res]
+        self.sequential_arrays /= factor
+        self.speed_arrays /= factor
 
-            # Compress the counter by the same amount
-            self.counter = round(self.counter / factor)
+        # Compress the counter by the same amount
+        self.counter = round(self.counter / factor)
 
     def _iter_array_types(self) -> Iterator[tuple[str, ArrayResolutionMap]]:
         yield 'sequential', self.sequential_arrays
@@ -485,7 +621,8 @@ class TrackingProfile:
         del_file = f'{temp_file_base}.del'
 
         try:
-            with zipfile.ZipFile(temp_file, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+            with zipfile.ZipFile(temp_file, mode='w', compression=zipfile.ZIP_DEFLATED,
+                                 compresslevel=ZIP_COMPRESSION_LEVEL) as zf:
                 self._write_to_zip(zf)
 
             # Quickly swap over the files to reduce chances of a race condition
@@ -582,23 +719,23 @@ class TrackingProfile:
         # Use the array shape as it does not always match the correct resolution
         for values in data['Resolution'].values():
             tracks = values['Tracks']
-            if np.any(tracks > 0):
-                self.cursor_map.sequential_arrays[tracks.shape[::-1]] = TrackingIntArray(tracks)
+            if tracks.any():
+                self.cursor_map.sequential_arrays[tracks.shape[::-1]] = TrackingIntArray(tracks, min_dtype=self.cursor_map.sequential_arrays.min_dtype)
 
             speed = values['Speed']
-            if np.any(speed > 0):
+            if speed.any():
                 self.cursor_map.speed_arrays[speed.shape[::-1]] = TrackingIntArray(speed)
 
             single_clicks = values['Clicks']['Single']
             for i, mb in enumerate(('Left', 'Middle', 'Right')):
                 array = single_clicks[mb]
-                if np.any(array > 0):
+                if array.any():
                     self.mouse_single_clicks[int(CLICK_CODES[i])][array.shape[::-1]] = TrackingIntArray(array)
 
             double_clicks = values['Clicks']['Double']
             for i, mb in enumerate(('Left', 'Middle', 'Right')):
                 array = double_clicks[mb]
-                if np.any(array > 0):
+                if array.any():
                     self.mouse_double_clicks[int(CLICK_CODES[i])][array.shape[::-1]] = TrackingIntArray(array)
 
         # Load in the metadata
@@ -614,19 +751,19 @@ class TrackingProfile:
         self.inactive = data['Ticks']['Total'] - self.active
 
         # Process key/button data
-        for keycode, count in data['Keys']['All']['Pressed'].items():
-            self.key_presses[keycode] = count
-        for keycode, count in data['Keys']['All']['Held'].items():
-            self.key_held[keycode] = count
+        pressed = data['Keys']['All']['Pressed']
+        self.key_presses.bulk_set(list(pressed.keys()), list(pressed.values()))
+        held = data['Keys']['All']['Held']
+        self.key_held.bulk_set(list(held.keys()), list(held.values()))
 
-        for keycode, count in data['Gamepad']['All']['Buttons']['Pressed'].items():
-            self.button_presses[0][keycode] = count
-        for keycode, count in data['Gamepad']['All']['Buttons']['Held'].items():
-            self.button_held[0][keycode] = count
+        pressed = data['Gamepad']['All']['Buttons']['Pressed']
+        self.button_presses[0].bulk_set(list(pressed.keys()), list(pressed.values()))
+        held = data['Gamepad']['All']['Buttons']['Held']
+        self.button_held[0].bulk_set(list(held.keys()), list(held.values()))
 
         # Simple way to get the density array populated
-        for array in map(np.asarray, self.cursor_map.sequential_arrays.values()):
-            self.cursor_map.density_arrays[array.shape[::-1]].array[np.where(array > 1)] = 1
+        for res, array in self.cursor_map.sequential_arrays.items():
+            self.cursor_map.density_arrays[res] = TrackingIntArray(np.greater(array.array, 1).view(np.uint8))
 
         return True
 
@@ -1668,6 +1668,10 @@ class MainWindow(QtWidgets.QMainWindow):
                         self._request_thumbnail()
                         self._thumbnail_redraw_required = False
 
+                # Processing shut down before the render could be read
+                elif message.expired:
+                    pass
+
                 # Save a render
                 elif failed:
                     msg = QtWidgets.QMessageBox(self)
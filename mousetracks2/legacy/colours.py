@@ -3,9 +3,13 @@ It has been trimmed down and type checked, but a full rewrite is needed.
 """
 
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
+import numpy as np
+import numpy.typing as npt
+
 from ..constants import REPO_DIR
 
 
@@ -72,8 +76,7 @@ class ColourRange(object):
         self._step_size = self.amount_diff / self.steps
 
         self.cache: list[tuple[int, ...]]
-        self.cache = [self._calculate_colour(round(self.min + i * self._step_size))
-                      for i in range(self.steps + 1)]
+        self.cache = self._calculate_colours(np.round(self.min + np.arange(self.steps + 1) * self._step_size))
 
     def __getitem__(self, n: int) -> tuple[int, ...]:
         """Read an item from the cache."""
@@ -87,29 +90,31 @@ class ColourRange(object):
                 return self.cache[value_index % self.steps]
         return self.cache[min(max(0, value_index), self.steps)]
 
-    def _calculate_colour(self, n: int) -> tuple[int, ...]:
-        """Calculate colour for given value."""
+    def _calculate_colours(self, n: npt.NDArray[np.float64]) -> list[tuple[int, ...]]:
+        """Calculate colours for an array of values."""
         offset = (n + self.offset - self.min) / self.amount_diff
         index_f = self._len_m * offset
 
         #Calculate the indexes of colours to mix
-        index_base = int(index_f)
+        index_base = np.trunc(index_f).astype(np.int64)
         index_mix = index_base + 1
         if self.loop:
             index_base %= self._len
             index_mix %= self._len
         else:
-            index_base = max(min(index_base, self._len_m), 0)
-            index_mix = max(min(index_mix, self._len_m), 0)
+            index_base = np.clip(index_base, 0, self._len_m)
+            index_mix = np.clip(index_mix, 0, self._len_m)
 
         #Mix colours
-        base_colour = self.colours[index_base]
-        mix_colour = self.colours[index_mix]
-        mix_ratio = max(min(index_f - index_base, 1), 0)
+        channels = min(map(len, self.colours))
+        colours = np.array([colour[:channels] for colour in self.colours])
+        base_colour = colours[index_base]
+        mix_colour = colours[index_mix]
+        mix_ratio = np.clip(index_f - index_base, 0, 1)[:, np.newaxis]
         mix_ratio_r = 1 - mix_ratio
 
-        return tuple(int(i * mix_ratio_r + j * mix_ratio)
-                     for i, j in zip(base_colour, mix_colour))
+        mixed = (base_colour * mix_ratio_r + mix_colour * mix_ratio).astype(np.int64)
+        return list(map(tuple, mixed.tolist()))
 
 
 def parse_colour_text(colours: str) -> list[tuple[int, ...]]:
@@ -251,16 +256,27 @@ def parse_colour_text(colours: str) -> list[tuple[int, ...]]:
 
 
 def calculate_colour_map(colour_map: str) -> list[tuple[int, ...]]:
+    """Get the colours of a colour map.
+    The result is cached until the colour file is modified.
+    """
+    return list(_calculate_colour_map(colour_map, COLOUR_FILE.stat().st_mtime_ns))
+
+
+@lru_cache(maxsize=32)
+def _calculate_colour_map(colour_map: str, modified: int) -> tuple[tuple[int, ...], ...]:
+    """Parse a colour map.
+    The modified time of the colour file is only used for the cache.
+    """
     if not colour_map:
         raise ValueError('not enough colours to generate colour map')
     try:
-        return parse_colour_text(parse_colour_file()['Maps'][to_lower(colour_map)]['Colour'])
+        return tuple(parse_colour_text(parse_colour_file()['Maps'][to_lower(colour_map)]['Colour']))
     except KeyError:
         generated_map = parse_colour_text(colour_map)
         if generated_map:
             if len(generated_map) < 2:
                 raise ValueError('not enough colours to generate colour map')
-            return generated_map
+            return tuple(generated_map)
         else:
             raise ValueError('unknown colour map')
 
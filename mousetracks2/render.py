@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import math
-from collections import defaultdict
-from functools import wraps
+import threading
+from collections import defaultdict, deque
+from functools import lru_cache, wraps
 from typing import Callable, Literal, Self
 
 import numpy as np
@@ -24,23 +25,78 @@ class EmptyRenderError(ValueError):
         super().__init__('input arrays cannot be empty if size not defined')
 
 
+class _ArrayPool:
+    """Hold on to large temporary arrays so they can be reused.
+    Repeated renders at the same size would otherwise allocate and free
+    the same buffers every time.
+    The total size is capped so that large exports aren't kept in
+    memory once they're done.
+    """
+
+    def __init__(self, max_arrays: int = 2, max_bytes: int = 128 * 1024 * 1024) -> None:
+        self._arrays: deque[np.ndarray] = deque(maxlen=max_arrays)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: tuple[int, ...], dtype: npt.DTypeLike) -> np.ndarray:
+        """Get an uninitialised array, reusing a released one if possible."""
+        dtype = np.dtype(dtype)
+        with self._lock:
+            for i, array in enumerate(self._arrays):
+                if array.shape == shape and array.dtype == dtype:
+                    del self._arrays[i]
+                    return array
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, array: np.ndarray) -> None:
+        """Return an array to the pool.
+        It must not be used again after this.
+        """
+        if array.nbytes > self._max_bytes:
+            return
+        with self._lock:
+            self._arrays.append(array)
+            while sum(a.nbytes for a in self._arrays) > self._max_bytes:
+                self._arrays.popleft()
+
+
+_ARRAY_POOL = _ArrayPool()
+
+
+def _popular_resolution(arrays: list[np.typing.ArrayLike], padding: int = 0) -> tuple[int, int]:
+    """Find the resolution with the most data.
+    Any resolutions with at least 90% as much data are also considered,
+    and the largest of those is chosen.
+    """
+    # Tracking arrays keep a count of non zero values to avoid a scan
+    popularity: dict[tuple[int, int], int] = defaultdict(int)
+    for array in arrays:
+        nonzero_count = getattr(array, 'nonzero_count', None)
+        array = np.asarray(array)
+        if nonzero_count is None:
+            nonzero_count = int(np.count_nonzero(array))
+        res_y, res_x = array.shape
+        popularity[(res_x + padding * 2, res_y + padding * 2)] += nonzero_count
+
+    threshold = max(popularity.values()) * 0.9
+    return max(res for res, value in popularity.items() if value >= threshold)
+
+
 def array_target_resolution(arrays: list[np.typing.ArrayLike], width: int | None = None,
-                            height: int | None = None, lock_aspect: bool = False) -> tuple[int, int]:
+                            height: int | None = None, lock_aspect: bool = False,
+                            padding: int = 0) -> tuple[int, int]:
     """Calculate a target resolution.
     If width or height is given, then it will be used.
     The aspect ratio can be taken into consideration.
+    Any padding to be applied to the arrays should be given, as it will
+    affect the aspect ratio.
     """
     # If not keeping aspect, return the given width and height
     if width is not None and height is not None and not lock_aspect:
         return width, height
 
     # Calculate the most common aspect ratio
-    popularity: dict[tuple[int, int], int] = defaultdict(int)
-    for array in map(np.asarray, arrays):
-        res_y, res_x = array.shape
-        popularity[(res_x, res_y)] += np.sum(np.greater(array, 0))
-    threshold = max(popularity.values()) * 0.9
-    _width, _height = max(res for res, value in popularity.items() if value >= threshold)
+    _width, _height = _popular_resolution(arrays, padding)
     aspect = _width / _height
 
     # Calculate the resolutions from the given width / height
@@ -65,13 +121,6 @@ def array_target_resolution(arrays: list[np.typing.ArrayLike], width: int | None
     return result_height
 
 
-def normalise_array(array: npt.NDArray[np.integer | np.floating]) -> npt.NDArray[np.float64]:
-    """Normalise an array so its values lie between 0 and 1."""
-    if max_value := np.max(array):
-        return array.astype(np.float64) / max_value
-    return np.zeros(array.shape, dtype=np.float64)
-
-
 def gaussian_size(width: int, height: int, multiplier: float = 0.0125) -> float:
     """Choose a gaussian blur amount to use for a given resolution."""
     return min(width, height) * multiplier
@@ -92,17 +141,118 @@ def array_rescale(array: np.typing.ArrayLike, target_width: int, target_height:
 
     # Upscale without blurring
     if sampling:
+        # Nearest neighbour is just a lookup, so avoid the overhead of zoom
+        if not interpolation_order:
+            rows = np.take(array, _nearest_indices(input_height, target_height), axis=0)
+            return np.take(rows, _nearest_indices(input_width, target_width), axis=1)
         zoom_factor = (target_height / input_height, target_width / input_width)
         return ndimage.zoom(array, zoom_factor, order=interpolation_order)
 
+    # Integer ratios can be pooled in blocks without any overlap
+    if not input_height % target_height and not input_width % target_width:
+        pooled_rows = _block_maximum(array, input_height // target_height, axis=0)
+        return _block_maximum(pooled_rows, input_width // target_width, axis=1)
+
     # Downscale without losing detail (credit to ChatGPT)
-    block_height = input_height / target_height
-    block_width = input_width / target_width
-    pooled_full = ndimage.maximum_filter(array, size=(math.ceil(block_height), math.ceil(block_width)))
+    # Only calculate the maximum filter at the sampled positions
+    pooled_rows = _sampled_maximum_filter(array, _sampled_windows(input_height, target_height), axis=0)
+    return _sampled_maximum_filter(pooled_rows, _sampled_windows(input_width, target_width), axis=1)
+
+
+def _maximum_by_shape(arrays: list[np.typing.ArrayLike]) -> list[np.typing.ArrayLike]:
+    """Combine any arrays of the same shape into their maximum values."""
+    grouped: dict[tuple[int, ...], list[np.ndarray]] = defaultdict(list)
+    for array in arrays:
+        array = np.asarray(array)
+        grouped[array.shape].append(array)
+
+    result: list[np.typing.ArrayLike] = []
+    for group in grouped.values():
+        if len(group) == 1:
+            result.append(group[0])
+            continue
+        combined = group[0].astype(np.result_type(*group))
+        for array in group[1:]:
+            np.maximum(combined, array, out=combined)
+        result.append(combined)
+    return result
+
+
+@lru_cache(maxsize=64)
+def _nearest_indices(input_size: int, output_size: int) -> npt.NDArray[np.intp]:
+    """Get the nearest input index for each output position.
+    The first and last positions are aligned, to match `ndimage.zoom`.
+    This is cached as renders rescale the same sizes repeatedly.
+    """
+    if input_size == 1 or output_size == 1:
+        indices = np.zeros(output_size, dtype=np.intp)
+    else:
+        positions = np.arange(output_size) * ((input_size - 1) / (output_size - 1))
+        indices = np.floor(positions + 0.5).astype(np.intp)
+    indices.flags.writeable = False
+    return indices
+
+
+def _block_maximum(array: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """Get the maximum of each block of values along an axis.
+    The length of the axis must be a multiple of the block size.
+    """
+    def offset(start: int) -> tuple[slice, ...]:
+        return (slice(None),) * axis + (slice(start, None, size),)
+
+    result = array[offset(0)].copy()
+    for i in range(1, size):
+        np.maximum(result, array[offset(i)], out=result)
+    return result
+
+
+@lru_cache(maxsize=64)
+def _sampled_windows(input_size: int, output_size: int) -> npt.NDArray[np.intp]:
+    """Get the maximum filter window of each sampled downscale position.
+    This is cached as renders rescale the same sizes repeatedly.
+    """
+    size = math.ceil(input_size / output_size)
+    indices = np.linspace(0, input_size - 1, output_size).astype(np.intp)
+
+    # Get the indices for every position of the window
+    # Any out of bounds indices are reflected to match the filter mode
+    windows = indices[:, np.newaxis] + np.arange(-(size // 2), size - size // 2)
+    windows = np.where(windows < 0, -windows - 1, windows)
+    windows = np.where(windows >= input_size, 2 * input_size - windows - 1, windows)
+    windows.flags.writeable = False
+    return windows
+
+
+def _sampled_maximum_filter(array: np.ndarray, windows: npt.NDArray[np.intp], axis: int) -> np.ndarray:
+    """Apply a 1D maximum filter along an axis, only at the given windows.
+    This gives the same result as `ndimage.maximum_filter1d` followed by
+    `np.take`, without filtering every row or column of the input.
+    """
+    result = np.take(array, windows[:, 0], axis=axis)
+    for window in windows.T[1:]:
+        np.maximum(result, np.take(array, window, axis=axis), out=result)
+    return result
+
 
-    indices_y = np.linspace(0, input_height - 1, target_height).astype(np.uint64)
-    indices_x = np.linspace(0, input_width - 1, target_width).astype(np.uint64)
-    return np.ascontiguousarray(pooled_full[indices_y][:, indices_x])
+def _linear_ranks(array: np.ndarray, max_lookup_size: int = 1 << 24) -> npt.NDArray[np.intp]:
+    """Replace each value with its rank out of all the unique values.
+
+    For integer arrays where the range isn't much larger than the
+    number of values, the ranks are counted from a lookup of which
+    values exist, which avoids a full sort.
+    Otherwise the sorted unique values are searched, which is still
+    faster than `np.unique(return_inverse=True)`.
+    """
+    if array.size and (np.issubdtype(array.dtype, np.unsignedinteger)
+                       or np.issubdtype(array.dtype, np.integer) and array.min() >= 0):
+        max_value = int(array.max())
+        if max_value < min(max_lookup_size, 4 * array.size):
+            exists = np.zeros(max_value + 1, dtype=np.bool_)
+            exists[array] = True
+            ranks = np.cumsum(exists, dtype=np.intp)
+            ranks -= 1
+            return ranks[array]
+    return np.searchsorted(np.unique(array), array)
 
 
 def _colour_to_np(bit_depth: int, r: int, g: int, b: int, a: int | None = None) -> npt.NDArray[np.float64]:
@@ -136,29 +286,37 @@ def generate_colour_lut(*colours: tuple[int, ...], input_bit_depth: int,
     if len(colours) == 1:
         return np.tile(_colour_to_np(input_bit_depth, *colours[0]), (steps, 1))
 
-    # Prepare the input array
-    rgba_array = np.zeros((len(colours), 4), dtype=np.float64)
-    for i, colour in enumerate(colours):
-        rgba_array[i] = _colour_to_np(input_bit_depth, *colour)
+    # Prepare the input array, defaulting to full opacity
+    peak = (1 << input_bit_depth) - 1
+    rgba_array = np.array([(*colour, peak)[:4] for colour in colours], dtype=np.float64)
+    rgba_array /= peak
 
-    # Define evenly spread positions for the input colours
-    stops = np.linspace(0, steps - 1, num=len(colours))
+    # Find the position of each step between the input colours
+    positions = np.linspace(0, len(colours) - 1, num=steps)
+    lower = np.minimum(positions.astype(np.intp), len(colours) - 2)
+    weights = (positions - lower)[:, np.newaxis]
 
-    # Create the final lookup table by interpolating each channel
-    lookup_indices = np.arange(steps)
-    lookup = np.zeros((steps, 4), dtype=np.float64)
+    # Interpolate all channels at once
+    return rgba_array[lower] * (1 - weights) + rgba_array[lower + 1] * weights
 
-    # Interpolate each channel in the normalized 0.0-1.0 range
-    for i in range(4):
-        lookup[:, i] = np.interp(lookup_indices, stops, rgba_array[:, i])
 
-    return lookup
+@lru_cache(maxsize=16)
+def _colour_lut_uint8(colour_map_data: tuple[tuple[int, ...], ...]) -> npt.NDArray[np.uint8]:
+    """Generate an 8 bit colour lookup table.
+    This is cached as the same colour map is used for most renders.
+    The returned array is read only.
+    """
+    colour_lut_float = generate_colour_lut(*colour_map_data, input_bit_depth=8, steps=256)
+    colour_lut_int = (colour_lut_float * 255).round().astype(np.uint8)
+    colour_lut_int.setflags(write=False)
+    return colour_lut_int
 
 
 def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typing.ArrayLike]],
            width: int | None = None, height: int | None = None, sampling: int = 1, lock_aspect: bool = True,
            linear: bool = False, blur: float = 0.0, contrast: float = 1.0, clipping: float = 0.0,
-           interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0, invert: bool = False) -> np.ndarray:
+           interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0, invert: bool = False,
+           padding: int = 0) -> np.ndarray:
     """Combine a group of arrays into a single array for rendering.
 
     Parameters:
@@ -189,16 +347,24 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
             Recommended to leave at 0, otherwise the arrays will be
             interpolated before the colours are mapped.
         invert: Invert the values / colours.
+        padding: Add empty pixels around the edges of each array.
+            This is done here rather than before calling, so that any
+            data cached on the arrays can still be used.
     """
     # Calculate width / height
     all_arrays = []
     for arrays in positional_arrays.values():
         all_arrays.extend(arrays)
     if all_arrays:
-        width, height = array_target_resolution(all_arrays, width, height, lock_aspect)
+        width, height = array_target_resolution(all_arrays, width, height, lock_aspect, padding)
     if not width or not height:
         raise EmptyRenderError
 
+    # Add extra padding
+    if padding:
+        positional_arrays = {pos: [np.pad(array, padding) for array in arrays]
+                             for pos, arrays in positional_arrays.items()}
+
     scale_width = width * (sampling or 1)
     scale_height = height * (sampling or 1)
 
@@ -206,21 +372,40 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
     combined_arrays: dict[tuple[int, int], np.ndarray] = {}
     for pos, arrays in positional_arrays.items():
         if arrays:
-            rescaled = [array_rescale(array, scale_width, scale_height, sampling, interpolation_order) for array in arrays]
-            combined_arrays[pos] = np.maximum.reduce(rescaled)
+            # Fold each array into the result as it is rescaled
+            # If it will be blurred, then fold straight into single
+            # precision to avoid another conversion pass afterwards
+            if blur and not linear:
+                dtype = np.dtype(np.float32)
+            else:
+                dtype = np.result_type(*(np.asarray(array).dtype for array in arrays))
+
+            # Rescaling by maximum or nearest neighbour gives the same
+            # result either side of combining, so arrays of the same
+            # resolution only need to be rescaled once
+            if not sampling or not interpolation_order:
+                arrays = _maximum_by_shape(arrays)
+
+            combined = array_rescale(arrays[0], scale_width, scale_height, sampling, interpolation_order).astype(dtype)
+            for array in arrays[1:]:
+                np.maximum(combined, array_rescale(array, scale_width, scale_height, sampling, interpolation_order), out=combined)
+            combined_arrays[pos] = combined
         else:
             combined_arrays[pos] = np.zeros([scale_height, scale_width], dtype=np.uint8)
 
     # Convert to linear arrays
     if linear:
-        combined_arrays = {pos: np.unique(array, return_inverse=True)[1]
-                           for pos, array in combined_arrays.items()}
+        combined_arrays = {pos: _linear_ranks(array) for pos, array in combined_arrays.items()}
 
     # Apply gaussian blur
+    # Single precision is used as it's much faster and the result only
+    # needs to be accurate enough to map to the colour lookup table
     if blur:
-        combined_arrays = {pos: ndimage.gaussian_filter(array.astype(np.float64),
-                                                        sigma=gaussian_size(scale_width, scale_height, blur))
-                           for pos, array in combined_arrays.items()}
+        sigma = gaussian_size(scale_width, scale_height, blur)
+        for pos, array in combined_arrays.items():
+            array = array.astype(np.float32, copy=False)
+            ndimage.gaussian_filter(array, sigma=sigma, output=array)
+            combined_arrays[pos] = array
 
     # Equalise the max values
     if len(combined_arrays) > 1:
@@ -234,12 +419,13 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
 
     # Clip the maximum values
     if clipping:
-        sorted_values, linear_mapping = np.unique(combined_array, return_inverse=True)
-        max_value = sorted_values[math.ceil(np.max(linear_mapping) * (1 - clipping))]
+        sorted_values = np.unique(combined_array)
+        max_value = sorted_values[math.ceil((len(sorted_values) - 1) * (1 - clipping))]
         combined_array[combined_array > max_value] = max_value
 
     # Update the contrast
     if contrast != 1.0 and np.any(combined_array):
+        combined_array = combined_array.astype(np.float64, copy=False)
 
         max_value = np.max(combined_array)
         max_value_log = np.log(max_value)
@@ -277,26 +463,40 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
     gradient_steps = 1 << bits_per_channel
     bit_depth_peak = gradient_steps - 1
 
-    # Generate a floating-point color lookup table (LUT) with values from 0.0 to 1.0
-    colour_lut_float = generate_colour_lut(*colour_map_data, input_bit_depth=8, steps=gradient_steps)
+    # Get the colour lookup table (LUT)
+    colour_lut_int = _colour_lut_uint8(tuple(map(tuple, colour_map_data)))
 
-    # Normalize the high-precision input data
-    normalised_data_float = normalise_array(combined_array)
-    index_array_float = normalised_data_float * bit_depth_peak
+    # Normalize the high-precision input data and convert it to indices
+    # The scaling is done in double precision, but as the indices only
+    # need to be accurate to 8 bits, the result is stored as float32
+    max_value = np.max(combined_array)
+    index_array = _ARRAY_POOL.acquire(combined_array.shape, np.float32)
+    np.multiply(combined_array, bit_depth_peak / max_value if max_value else 0.0,
+                out=index_array, casting='same_kind')
+    np.rint(index_array, out=index_array)
 
-    # Convert the float LUT and the index array to the target integer type
-    colour_lut_int = (colour_lut_float * bit_depth_peak).round().astype(target_dtype)
-    index_array_int = index_array_float.round().astype(target_dtype)
+    # Convert the index array to the target integer type
+    index_array_int = index_array.astype(target_dtype)
+    _ARRAY_POOL.release(combined_array)
+    _ARRAY_POOL.release(index_array)
 
     # Use the LUT
-    return colour_lut_int[index_array_int]
+    # Each colour is packed into a single uint32 so it can be gathered
+    # in one read per pixel, rather than 4 separate bytes
+    packed_lut = colour_lut_int.view(np.uint32).reshape(-1)
+    return np.take(packed_lut, index_array_int).view(np.uint8).reshape(*index_array_int.shape, 4)
 
 
 def combine_array_grid(positional_arrays: dict[tuple[int, int], np.ndarray],
                        scale_width: int, scale_height: int) -> np.ndarray:
-    """Combine arrays based on their positions and offsets."""
+    """Combine arrays based on their positions and offsets.
+    The result keeps the common dtype of the arrays, and is taken from
+    the array pool so it can be released when no longer needed.
+    """
     if not positional_arrays:
-        return np.zeros((scale_height, scale_width), dtype=np.float64)
+        combined_array = _ARRAY_POOL.acquire((scale_height, scale_width), np.float64)
+        combined_array.fill(0)
+        return combined_array
 
     if len(set(array.shape for array in positional_arrays.values())) != 1:
         raise ValueError('all arrays must be the same size')
@@ -310,7 +510,12 @@ def combine_array_grid(positional_arrays: dict[tuple[int, int], np.ndarray],
     total_height = scale_height * (max(0, max_row) - min(0, min_row) + 1)
 
     # Create the combined array
-    combined_array = np.zeros((total_height, total_width), dtype=np.float64)
+    # It only needs clearing if any cells of the grid won't be filled
+    dtype = np.result_type(*positional_arrays.values())
+    combined_array = _ARRAY_POOL.acquire((total_height, total_width), dtype)
+    num_cells = (total_width // scale_width) * (total_height // scale_height)
+    if min_col < 0 or min_row < 0 or len(positional_arrays) < num_cells:
+        combined_array.fill(0)
     for (col, row), array in positional_arrays.items():
         x = col * scale_width
         y = row * scale_height
@@ -1,5 +1,8 @@
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Callable, Generic, Iterable, Self, SupportsIndex, TypeVar, cast, overload
+from typing import TYPE_CHECKING, Callable, Generic, Iterable, Iterator, Self, SupportsIndex, TypeVar, cast, overload
+
+import numpy as np
+import numpy.typing as npt
 
 
 T = TypeVar('T')
@@ -157,14 +160,7 @@ class RectList(list[Rect]):
             return None
 
         if combined:
-            x_min, y_min, x_max, y_max = self[0].rect
-            for x1, y1, x2, y2 in self[1:].rects:
-                x_min = min(x_min, x1)
-                y_min = min(y_min, y1)
-                x_max = max(x_max, x2)
-                y_max = max(y_max, y2)
-
-            rect = Rect.from_rect(x_min, y_min, x_max, y_max)
+            rect = self.combined_rect()
             offset_pixel = rect.calculate_offset(coordinate)
             if offset_pixel is not None:
                 return rect.size, offset_pixel
@@ -177,6 +173,44 @@ class RectList(list[Rect]):
 
         return None
 
+    def calculate_offsets(self, coordinates: npt.NDArray[np.integer], combined: bool = False,
+                          ) -> Iterator[tuple[tuple[int, int], npt.NDArray[np.integer]]]:
+        """Detect which rects contain an array of coordinates.
+        This is the same as `calculate_offset`, but for multiple
+        coordinates at once. Each coordinate is only assigned to the
+        first rect containing it.
+
+        Parameters:
+            coordinates: Array of (x, y) coordinates, with a shape of (n, 2).
+
+        Yields:
+            The rect size and offset coordinates for each rect.
+            Any coordinates not within bounds are skipped.
+        """
+        if not self or not len(coordinates):
+            return
+
+        rects = [self.combined_rect()] if combined else self
+        x = coordinates[:, 0]
+        y = coordinates[:, 1]
+        remaining = np.ones(len(coordinates), dtype=np.bool_)
+        for rect in rects:
+            mask = remaining & (x >= rect.left) & (x < rect.right) & (y >= rect.top) & (y < rect.bottom)
+            if not mask.any():
+                continue
+            remaining &= ~mask
+            yield rect.size, coordinates[mask] - rect.position
+
+    def combined_rect(self) -> Rect:
+        """Get a rect containing all the other rects."""
+        x_min, y_min, x_max, y_max = self[0].rect
+        for x1, y1, x2, y2 in self[1:].rects:
+            x_min = min(x_min, x1)
+            y_min = min(y_min, y1)
+            x_max = max(x_max, x2)
+            y_max = max(y_max, y2)
+        return Rect.from_rect(x_min, y_min, x_max, y_max)
+
     @property
     def rects(self) -> list[tuple[int, int, int, int]]:
         return [item.rect for item in self]
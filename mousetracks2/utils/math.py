@@ -1,5 +1,8 @@
 """General math functions."""
 
+import numpy as np
+import numpy.typing as npt
+
 
 def calculate_distance(p1: tuple[int, int] | None, p2: tuple[int, int] | None) -> float:
     """Find the distance between two (x, y) coordinates."""
@@ -40,6 +43,37 @@ def calculate_line(start: tuple[int, int] | None, end: tuple[int, int] | None) -
     return result
 
 
+def calculate_line_array(start: tuple[int, int] | None, end: tuple[int, int] | None) -> npt.NDArray[np.int64]:
+    """Calculates path in terms of pixels between two points.
+    This gives the same result as `calculate_line`, but calculates
+    all pixels at once and returns them as an array of shape (n, 2).
+    """
+    if start is None or end is None or start == end:
+        return np.empty((0, 2), dtype=np.int64)
+
+    x1, y1 = start
+    x2, y2 = end
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+
+    # Step along the major axis and round the minor axis
+    # The rounding matches the error term from Bresenham's algorithm
+    steps = np.arange(1, max(dx, dy) + 1, dtype=np.int64)
+    result = np.empty((len(steps), 2), dtype=np.int64)
+    if dx >= dy:
+        result[:, 0] = steps
+        result[:, 1] = (2 * dy * steps + dx - 1) // (2 * dx)
+    else:
+        result[:, 0] = (2 * dx * steps + dy - 1) // (2 * dy)
+        result[:, 1] = steps
+
+    result *= (sx, sy)
+    result += (x1, y1)
+    return result
+
+
 def calculate_circle(radius: int, segments: tuple[bool, bool, bool, bool] = (True, True, True, True)
                      ) -> tuple[set[tuple[int, int]], set[tuple[int, int]]]:
     """Get the area and outline of a circle as pixels.